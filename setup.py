@@ -0,0 +1,16 @@
+"""
+Builds the optional compiled transform (see transform.pyx):
+
+    pip install cython
+    python setup.py build_ext --inplace
+
+scrape_jira.py picks the extension up automatically when present.
+"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="scaler-scraper-transform",
+    ext_modules=cythonize("transform.pyx", language_level=3),
+)
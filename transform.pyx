@@ -0,0 +1,132 @@
+# cython: language_level=3
+"""
+Compiled version of scrape_jira.transform_issue_for_llm.
+
+The transform runs once per issue across the whole corpus and is pure
+dict/string shuffling, so Cython's typed locals and C-level dict access
+shave the interpreter overhead off the hottest remaining Python loop.
+Build with `python setup.py build_ext --inplace`; scrape_jira.py falls
+back to its pure-Python implementation when this module is absent, so
+the extension is strictly optional.
+
+Keep the logic in sync with the pure-Python function in scrape_jira.py -
+that copy is the reference implementation.
+"""
+
+import logging
+import sys
+
+import orjson
+
+_INSTR_SUMMARIZATION = "Summarize the following software issue, including its description and all comments, into a concise one-sentence title."
+_INSTR_CLASSIFICATION = "Based on the issue title and description, classify its priority. Valid options are: Blocker, Critical, Major, Minor, Trivial, Unknown."
+_INSTR_QA = "What is the status of this issue?"
+
+_URL_PREFIX = "https://issues.apache.org/jira/browse/"
+
+_META_FIELDS = (
+    ('project', 'key', 'Unknown'),
+    ('status', 'name', 'Unknown'),
+    ('priority', 'name', 'Unknown'),
+    ('reporter', 'displayName', 'Unknown'),
+    ('assignee', 'displayName', 'Not Assigned'),
+)
+
+
+cpdef bytes transform_issue_for_llm(dict issue, bint inline_derived_tasks=False):
+    """
+    Transforms the raw Jira JSON issue into one serialized JSONL line
+    (bytes, newline included). Mirrors scrape_jira.transform_issue_for_llm;
+    'inline_derived_tasks' corresponds to INLINE_DERIVED_TASKS there and is
+    bound via functools.partial at import time.
+    """
+    cdef dict fields
+    cdef dict meta
+    cdef dict comment_data
+    cdef list all_comments
+    cdef list derived_tasks
+    cdef str field, subkey, default
+
+    try:
+        issue_key = issue.get('key')
+        fields = issue.get('fields') or {}
+        if not fields:
+            logging.warning(f"Issue {issue_key} has no 'fields'. Skipping.")
+            return None
+
+        title = fields.get('summary', 'No Title')
+        description = fields.get('description') or "No Description Provided"
+
+        meta = {}
+        for field, subkey, default in _META_FIELDS:
+            obj = fields.get(field)
+            meta[field] = sys.intern(obj.get(subkey) or default) if obj else default
+
+        created = fields.get('created', '')
+        labels = fields.get('labels', [])
+
+        all_comments = []
+        comment_data = fields.get('comment')
+        if comment_data and 'comments' in comment_data:
+            for comment in comment_data['comments']:
+                author_obj = comment.get('author')
+                author = author_obj.get('displayName', 'Unknown') if author_obj else 'Unknown'
+                body = comment.get('body', '').strip()
+                if body:
+                    all_comments.append(f"Comment by {author}:\n{body}\n---")
+
+        comments_text = "\n".join(all_comments) if all_comments else "No Comments"
+
+        fields.pop('comment', None)
+        del comment_data, all_comments
+
+        derived_tasks = [
+            {
+                "task_type": "summarization",
+                "instruction": _INSTR_SUMMARIZATION,
+                "output": title
+            },
+            {
+                "task_type": "classification",
+                "instruction": _INSTR_CLASSIFICATION,
+                "output": meta['priority']
+            },
+            {
+                "task_type": "question_answering",
+                "instruction": _INSTR_QA,
+                "output": meta['status']
+            }
+        ]
+
+        if inline_derived_tasks:
+            description_block = f"Description:\n{description}\n\nComments:\n{comments_text}"
+            derived_tasks[0]["input"] = description_block
+            derived_tasks[1]["input"] = f"Title: {title}\nDescription: {description}"
+            derived_tasks[2]["input"] = f"Title: {title}\n{description_block}"
+        else:
+            derived_tasks[0]["input_fields"] = ["description", "comments_text"]
+            derived_tasks[1]["input_fields"] = ["title", "description"]
+            derived_tasks[2]["input_fields"] = ["title", "description", "comments_text"]
+
+        structured_data = {
+            "id": issue_key,
+            "project": meta['project'],
+            "title": title,
+            "description": description,
+            "comments_text": comments_text,
+            "metadata": {
+                "status": meta['status'],
+                "priority": meta['priority'],
+                "reporter": meta['reporter'],
+                "assignee": meta['assignee'],
+                "created_at": created,
+                "labels": labels,
+                "issue_url": _URL_PREFIX + issue_key if issue_key else None
+            },
+            "derived_tasks": derived_tasks
+        }
+        return orjson.dumps(structured_data) + b'\n'
+
+    except Exception as e:
+        logging.error(f"Failed to transform issue {issue.get('key')}: {e}")
+        return None